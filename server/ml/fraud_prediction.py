@@ -13,6 +13,7 @@ import os
 import sys
 import json
 import argparse
+from collections import Counter
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
@@ -23,6 +24,14 @@ from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import RobustScaler
 import joblib
 
+# Optional: score with the ONNX export of the model (see train_fraud_model.save_model)
+ONNX_AVAILABLE = False
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    pass
+
 # Database
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -73,32 +82,79 @@ THRESHOLDS = {
 _model = None
 _scaler = None
 _metadata = None
+_onnx_session = None
+_scaler_params = None  # float32 (center, scale) of the loaded scaler
 
 def load_model():
     """Load trained model, scaler, and metadata (cached)"""
-    global _model, _scaler, _metadata
+    global _model, _scaler, _metadata, _onnx_session, _scaler_params
     
     if _model is not None:
         return _model, _scaler, _metadata
     
     model_path = os.path.join(MODEL_DIR, 'anomaly_model.pkl')
     scaler_path = os.path.join(MODEL_DIR, 'anomaly_scaler.pkl')
+    scaler_params_path = os.path.join(MODEL_DIR, 'anomaly_scaler.npz')
     metadata_path = os.path.join(MODEL_DIR, 'anomaly_metadata.pkl')
+    onnx_path = os.path.join(MODEL_DIR, 'anomaly_model.onnx')
     
     # Check if model files exist
     if not os.path.exists(model_path):
         return None, None, None
     
     try:
-        _model = joblib.load(model_path)
-        _scaler = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
+        # Memory-map the tree arrays: faster cold start, and the pages are
+        # shared between worker processes loading the same file
+        _model = joblib.load(model_path, mmap_mode='r')
         _metadata = joblib.load(metadata_path) if os.path.exists(metadata_path) else {}
+        
+        # Scale with plain array ops at inference instead of scaler.transform.
+        # Prefer the .npz parameters (no sklearn unpickling); fall back to the
+        # pickled scaler for models saved before it existed
+        if os.path.exists(scaler_params_path):
+            with np.load(scaler_params_path) as params:
+                _scaler_params = (params['center'], params['scale'])
+        elif os.path.exists(scaler_path):
+            _scaler = joblib.load(scaler_path)
+            center = _scaler.center_ if _scaler.center_ is not None else 0
+            scale = _scaler.scale_ if _scaler.scale_ is not None else 1
+            _scaler_params = (np.asarray(center, dtype=np.float32),
+                              np.asarray(scale, dtype=np.float32))
+        
+        # Use the ONNX export only if it is at least as new as the pickled model
+        if (ONNX_AVAILABLE and _scaler_params is not None and os.path.exists(onnx_path)
+                and os.path.getmtime(onnx_path) >= os.path.getmtime(model_path)):
+            try:
+                _onnx_session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+            except Exception as e:
+                print(f"Error loading ONNX model, using scikit-learn: {e}", file=sys.stderr)
         return _model, _scaler, _metadata
     except Exception as e:
         print(f"Error loading model: {e}", file=sys.stderr)
         return None, None, None
 
 
+def score_samples(model: IsolationForest, scaler: Optional[RobustScaler], X: np.ndarray) -> np.ndarray:
+    """
+    Raw Isolation Forest scores for a feature matrix (more negative = more anomalous).
+    Uses the ONNX graph when loaded; its 'scores' output is decision_function,
+    i.e. score_samples shifted by the model's offset_.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if _onnx_session is not None:
+        scores = _onnx_session.run(['scores'], {'input': X})[0]
+        return scores[:, 0] + model.offset_
+    
+    if scaler is _scaler and _scaler_params is not None:
+        center, scale = _scaler_params
+        X_scaled = (X - center) / scale
+    elif scaler is None:
+        X_scaled = X
+    else:
+        X_scaled = scaler.transform(X)
+    return model.score_samples(X_scaled)
+
+
 def is_model_available() -> bool:
     """Check if the fraud detection model is available"""
     model, _, _ = load_model()
@@ -248,10 +304,12 @@ def compute_features_for_cheque(cheque_data: Dict, profile: Optional[Dict],
     payee = cheque_data.get('payeeName') or ''
     
     if recent_txns:
-        past_receivers = [t.get('receiver_name', '') for t in recent_txns if t.get('receiver_name')]
-        features['is_new_payee'] = 0 if payee and payee in past_receivers else 1
-        features['payee_frequency'] = past_receivers.count(payee) if payee else 0
-        features['unique_payee_ratio'] = len(set(past_receivers)) / len(past_receivers) if past_receivers else 1
+        # One pass over history: per-payee counts give frequency and uniqueness
+        payee_counts = Counter(t['receiver_name'] for t in recent_txns if t.get('receiver_name'))
+        total_payees = sum(payee_counts.values())
+        features['is_new_payee'] = 0 if payee_counts.get(payee) else 1
+        features['payee_frequency'] = payee_counts.get(payee, 0)
+        features['unique_payee_ratio'] = len(payee_counts) / total_payees if total_payees else 1
     else:
         features['is_new_payee'] = 1
         features['payee_frequency'] = 0
@@ -655,14 +713,10 @@ def predict_fraud(cheque_data: Dict, signature_score: float = 85) -> Dict:
     
     if use_ml_model:
         # ML Model Path
-        X = np.array([[features.get(col, 0) for col in FEATURE_COLUMNS]])
-        
-        if scaler is not None:
-            X_scaled = scaler.transform(X)
-        else:
-            X_scaled = X
+        X = np.fromiter((features.get(col, 0) for col in FEATURE_COLUMNS),
+                        dtype=np.float32, count=len(FEATURE_COLUMNS)).reshape(1, -1)
         
-        raw_score = model.score_samples(X_scaled)[0]
+        raw_score = score_samples(model, scaler, X)[0]
         anomaly_score = max(0, min(1, 0.5 - raw_score))
         ml_fraud_score = anomaly_score * 100
         
@@ -3,7 +3,11 @@ Siamese Transformer Model Loader
 Loads the trained signature verification model from fraud-detection-signature-varification.ipynb
 Uses exact same architecture as training notebook
 """
+import io
 import os
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
 from PIL import Image
 
@@ -14,7 +18,8 @@ CONFIG = {
     'transformer_layers': 2,
     'dropout': 0.1,
     'margin': 1.0,
-    'threshold': 0.5  # Distance threshold for matching
+    'threshold': 0.5,  # Distance threshold for matching
+    'preprocess_cache_size': int(os.environ.get('PREPROCESS_CACHE_SIZE', 128))  # ~600 KB per cached tensor
 }
 
 # Try to import PyTorch
@@ -23,6 +28,7 @@ try:
     import torch
     import torch.nn as nn
     import torch.nn.functional as F
+    from torch.nn.utils.fusion import fuse_linear_bn_eval
     from torchvision import models, transforms
     TORCH_AVAILABLE = True
     print("✅ PyTorch loaded successfully")
@@ -30,6 +36,14 @@ except Exception as e:
     print(f"⚠️  PyTorch import failed: {e}")
     print("📋 Running in MOCK mode - using simple image comparison")
 
+# OpenCV gives a faster decode + resize than PIL (falls back to PIL if missing)
+CV2_AVAILABLE = False
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    pass
+
 
 # Only define the model class if torch is available
 if TORCH_AVAILABLE:
@@ -38,12 +52,13 @@ if TORCH_AVAILABLE:
         Siamese Network with EfficientNet-B0 backbone + Transformer encoder
         EXACT architecture from fraud-detection-signature-varification.ipynb
         """
-        def __init__(self):
+        def __init__(self, pretrained_backbone=True):
             super(SiameseTransformer, self).__init__()
             
             # 1. EfficientNet-B0 Backbone 🚀
             # We strip the final classification head (the 'classifier' sequential block) 
-            efficientnet = models.efficientnet_b0(weights='IMAGENET1K_V1')
+            # ImageNet weights are only needed when no trained checkpoint will overwrite them
+            efficientnet = models.efficientnet_b0(weights='IMAGENET1K_V1' if pretrained_backbone else None)
             # EfficientNet stores its features in the 'features' attribute, 
             # which is an nn.Sequential block. We use this directly.
             self.backbone = efficientnet.features
@@ -105,6 +120,15 @@ if TORCH_AVAILABLE:
             embedding = self.fc(embedding)
             return embedding
 
+        def fuse_head(self):
+            """
+            Fold the head's BatchNorm into the preceding Linear for inference.
+            Dropout is a no-op in eval mode, so the head becomes Linear -> ReLU -> Linear.
+            Must be called after the trained weights are loaded and the model is in eval mode.
+            """
+            linear1, bn, relu, _, linear2 = self.fc
+            self.fc = nn.Sequential(fuse_linear_bn_eval(linear1, bn), relu, linear2)
+
         def forward(self, img1, img2):
             out1 = self.forward_one(img1)
             out2 = self.forward_one(img2)
@@ -132,8 +156,14 @@ class ModelManager:
     _model = None
     _device = None
     _transform = None
+    _norm_mean = None
+    _norm_std = None
     _mock_mode = False
     _model_loaded = False
+    _tensor_cache = None
+    _cache_lock = threading.Lock()
+    _cache_hits = 0
+    _cache_misses = 0
     
     def __new__(cls):
         if cls._instance is None:
@@ -173,11 +203,11 @@ class ModelManager:
         print(f"🔧 Initializing Siamese Transformer on {self._device}")
         
         try:
-            # Create model with EXACT architecture from training notebook
-            self._model = SiameseTransformer()
-            
             # Load trained weights
             if model_path and os.path.exists(model_path):
+                # Create model with EXACT architecture from training notebook
+                # The checkpoint overwrites every backbone weight, so skip the ImageNet download
+                self._model = SiameseTransformer(pretrained_backbone=False)
                 print(f"📦 Loading trained model weights from {model_path}")
                 try:
                     state_dict = torch.load(model_path, map_location=self._device, weights_only=True)
@@ -187,13 +217,16 @@ class ModelManager:
                 except Exception as e:
                     print(f"⚠️  Warning: Could not load weights: {e}")
                     print("📋 Using pretrained EfficientNet backbone (ImageNet) - predictions may be less accurate")
+                    self._model = SiameseTransformer()
             else:
                 print(f"⚠️  Model file not found at: {model_path}")
                 print("📋 Using pretrained EfficientNet backbone (ImageNet) - predictions may be less accurate")
+                self._model = SiameseTransformer()
             
             # Move to device and set to eval mode
             self._model.to(self._device)
             self._model.eval()
+            self._model.fuse_head()
             
             # Define preprocessing transform (same as training)
             self._transform = transforms.Compose([
@@ -201,6 +234,12 @@ class ModelManager:
                 transforms.ToTensor(),
                 transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
             ])
+            # Same normalization as tensors on the device, for preprocess_bytes
+            self._norm_mean = torch.tensor([0.485, 0.456, 0.406], device=self._device).view(3, 1, 1)
+            self._norm_std = torch.tensor([0.229, 0.224, 0.225], device=self._device).view(3, 1, 1)
+            
+            # LRU of preprocessed tensors keyed by image content hash
+            self._tensor_cache = OrderedDict()
             
             print("✅ Model initialization complete")
         except Exception as e:
@@ -238,6 +277,63 @@ class ModelManager:
         tensor = self._transform(image_data)
         return tensor.unsqueeze(0).to(self._device)  # Add batch dimension
     
+    def preprocess_bytes(self, image_bytes):
+        """
+        Decode and preprocess an encoded image (PNG, JPEG, ...) for model input
+        Decodes straight to a 224x224 RGB array with OpenCV instead of
+        PIL open + transforms, then normalizes on the model device.
+        Results are cached by content hash, so a reference signature that is
+        uploaded again skips decoding and preprocessing entirely.
+        Args:
+            image_bytes: Encoded image file contents
+        Returns:
+            torch.Tensor or PIL Image (in mock mode)
+        Raises:
+            ValueError: If the bytes are not a decodable image
+        """
+        if self._mock_mode or not TORCH_AVAILABLE or not CV2_AVAILABLE:
+            try:
+                image = Image.open(io.BytesIO(image_bytes))
+                image.load()
+            except Exception as e:
+                raise ValueError(f"Failed to decode image: {str(e)}")
+            return self.preprocess_image(image)
+        
+        key = hashlib.blake2b(image_bytes, digest_size=16).digest()
+        with self._cache_lock:
+            tensor = self._tensor_cache.get(key)
+            if tensor is not None:
+                self._tensor_cache.move_to_end(key)
+                self._cache_hits += 1
+                return tensor
+            self._cache_misses += 1
+        
+        tensor = self._decode_to_tensor(image_bytes)
+        
+        with self._cache_lock:
+            self._tensor_cache[key] = tensor
+            while len(self._tensor_cache) > CONFIG['preprocess_cache_size']:
+                self._tensor_cache.popitem(last=False)
+        return tensor
+    
+    def _decode_to_tensor(self, image_bytes):
+        """Decode encoded image bytes into a normalized [1, 3, 224, 224] tensor"""
+        # IMREAD_COLOR also expands grayscale and drops alpha, like convert('RGB')
+        buf = np.frombuffer(image_bytes, np.uint8)
+        img = cv2.imdecode(buf, cv2.IMREAD_COLOR) if buf.size else None
+        if img is None:
+            raise ValueError("Failed to decode image")
+        
+        # INTER_AREA for shrinking, bilinear when the crop is smaller than the input size
+        h, w = img.shape[:2]
+        interpolation = cv2.INTER_AREA if h >= 224 and w >= 224 else cv2.INTER_LINEAR
+        img = cv2.resize(img, (224, 224), interpolation=interpolation)
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        
+        tensor = torch.from_numpy(img).to(self._device).permute(2, 0, 1).float().div_(255)
+        tensor = (tensor - self._norm_mean) / self._norm_std
+        return tensor.unsqueeze(0)  # Add batch dimension
+    
     def _compute_mock_similarity(self, img1, img2):
         """
         Compute a deterministic similarity score based on image properties
@@ -332,3 +428,15 @@ class ModelManager:
     @property
     def is_model_loaded(self):
         return self._model_loaded
+    
+    @property
+    def cache_stats(self):
+        """Preprocessed tensor cache usage"""
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            'size': len(self._tensor_cache) if self._tensor_cache is not None else 0,
+            'max_size': CONFIG['preprocess_cache_size'],
+            'hits': self._cache_hits,
+            'misses': self._cache_misses,
+            'hit_rate': self._cache_hits / lookups if lookups else 0.0
+        }
@@ -7,8 +7,6 @@ Endpoints:
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import base64
-import io
-from PIL import Image
 import os
 import sys
 
@@ -31,20 +29,15 @@ MODEL_PATH = os.environ.get('MODEL_PATH', DEFAULT_MODEL_PATH)
 PORT = int(os.environ.get('ML_SERVICE_PORT', 5005))
 
 
-def base64_to_image(base64_string):
-    """Convert base64 string to PIL Image"""
+def base64_to_bytes(base64_string):
+    """Convert base64 string (optionally a data URL) to encoded image bytes"""
     try:
         # Remove data URL prefix if present
         if ',' in base64_string:
             base64_string = base64_string.split(',')[1]
         
         # Decode base64
-        image_data = base64.b64decode(base64_string)
-        
-        # Convert to PIL Image
-        image = Image.open(io.BytesIO(image_data))
-        
-        return image
+        return base64.b64decode(base64_string)
     except Exception as e:
         raise ValueError(f"Failed to decode base64 image: {str(e)}")
 
@@ -57,7 +50,8 @@ def health_check():
         'service': 'signature-verification-ml',
         'model_loaded': model_manager.is_model_loaded if hasattr(model_manager, 'is_model_loaded') else model_manager.model is not None,
         'mock_mode': model_manager.is_mock_mode,
-        'device': str(model_manager.device) if model_manager.device else 'cpu (mock mode)'
+        'device': str(model_manager.device) if model_manager.device else 'cpu (mock mode)',
+        'preprocess_cache': model_manager.cache_stats
     })
 
 
@@ -102,20 +96,16 @@ def verify_signature():
                 'error': 'Both signature1 and signature2 are required'
             }), 400
         
-        # Convert base64 to images
+        # Decode base64 and preprocess each image in a single step
         try:
-            img1 = base64_to_image(signature1_b64)
-            img2 = base64_to_image(signature2_b64)
+            img1_tensor = model_manager.preprocess_bytes(base64_to_bytes(signature1_b64))
+            img2_tensor = model_manager.preprocess_bytes(base64_to_bytes(signature2_b64))
         except ValueError as e:
             return jsonify({
                 'success': False,
                 'error': str(e)
             }), 400
         
-        # Preprocess images
-        img1_tensor = model_manager.preprocess_image(img1)
-        img2_tensor = model_manager.preprocess_image(img2)
-        
         # Compute similarity
         result = model_manager.compute_similarity(img1_tensor, img2_tensor)
         
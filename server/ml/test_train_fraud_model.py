@@ -0,0 +1,97 @@
+"""
+Regression tests for train_fraud_model feature extraction
+
+Usage:
+    cd server/ml && python -m pytest test_train_fraud_model.py
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from train_fraud_model import FeatureExtractor, FEATURE_COLUMNS, TRANSACTION_DTYPES
+
+
+def make_transactions(receivers, account_created_at='2023-01-01T00:00:00Z'):
+    """Transactions of one account, one hour apart, shaped like FeatureExtractor.iter_transactions output"""
+    n = len(receivers)
+    created = pd.date_range('2024-01-01 10:00', periods=n, freq='h', tz='UTC')
+    amount = np.full(n, 1000.0)
+    return pd.DataFrame({
+        'transaction_id': np.arange(1, n + 1, dtype=np.int32),
+        'account_id': np.ones(n, dtype=np.int32),
+        'amount': amount,
+        'receiver_name': pd.Series(receivers, dtype='category'),
+        'txn_date': pd.Series(pd.NaT, index=range(n), dtype='datetime64[ns, UTC]'),
+        'txn_time': pd.Series([None] * n, dtype=object),
+        'current_balance': 50000.0,
+        'created_at': created,
+        'account_created_at': pd.to_datetime(pd.Series([account_created_at] * n), utc=True),
+        'prev_created_at': pd.Series(created).shift(1),
+        'txn_count_24h': np.arange(n, dtype=np.int32),
+        'txn_count_7d': np.arange(n, dtype=np.int32),
+        'hist_avg_amount': pd.Series(amount, dtype='float64').expanding().mean().shift(1),
+        'hist_std_amount': pd.Series(amount, dtype='float64').expanding().std().shift(1),
+        'hist_max_amount': pd.Series(amount, dtype='float64').expanding().max().shift(1),
+    })
+
+
+NO_PROFILES = pd.DataFrame({
+    'account_id': pd.Series(dtype='int32'),
+    'avg_transaction_amt': pd.Series(dtype='float64'),
+    'max_transaction_amt': pd.Series(dtype='float64'),
+    'stddev_transaction_amt': pd.Series(dtype='float64'),
+    'bounce_rate': pd.Series(dtype='float64'),
+    'usual_hours_mask': pd.Series(dtype='uint32'),
+})
+
+
+def compute(transactions, profiles=NO_PROFILES):
+    return FeatureExtractor(conn=None).compute_features(transactions, profiles)
+
+
+def test_null_receiver_with_history_uses_no_payee_defaults():
+    features = compute(make_transactions(['Payee A', 'Payee A', None]))
+    
+    assert list(features.columns[:len(FEATURE_COLUMNS)]) == FEATURE_COLUMNS
+    null_row = features.iloc[2]
+    assert null_row['is_new_payee'] == 1
+    assert null_row['payee_frequency'] == 0
+    assert null_row['unique_payee_ratio'] == 1
+
+
+def test_known_receiver_with_history_compares_past_payees():
+    features = compute(make_transactions(['Payee A', None, 'Payee A']))
+    
+    repeat_row = features.iloc[2]
+    assert repeat_row['is_new_payee'] == 0
+    assert repeat_row['payee_frequency'] == 1
+    assert repeat_row['unique_payee_ratio'] == 1
+
+
+def test_missing_account_created_at_defaults_to_one_year():
+    features = compute(make_transactions(['Payee A', 'Payee B'], account_created_at=None))
+    
+    assert (features['account_age_days'] == 365).all()
+
+
+def test_amount_equal_to_profile_max_is_not_above_max():
+    # Money columns parsed exactly as the COPY stream is
+    csv = io.StringIO("amount,current_balance\n123456.78,500000.00\n")
+    money = pd.read_csv(csv, dtype={col: TRANSACTION_DTYPES[col] for col in ('amount', 'current_balance')})
+    transactions = make_transactions(['Payee A']).assign(
+        amount=money['amount'], current_balance=money['current_balance'])
+    profiles = pd.DataFrame({
+        'account_id': [1],
+        'avg_transaction_amt': [100000.0],
+        'max_transaction_amt': [123456.78],
+        'stddev_transaction_amt': [5000.0],
+        'bounce_rate': [0.0],
+        'usual_hours_mask': np.array([0], dtype='uint32'),
+    })
+    
+    features = compute(transactions, profiles)
+    
+    assert features['is_above_max'].iloc[0] == 0
+    assert features['amount'].iloc[0] == 123456.78
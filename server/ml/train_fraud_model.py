@@ -24,23 +24,69 @@ Requirements:
 """
 
 import os
+import io
+import hashlib
+import json
 import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple, Optional, Union
 import warnings
 warnings.filterwarnings('ignore')
 
 # ML Libraries - Unsupervised
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler, RobustScaler
-from sklearn.neighbors import LocalOutlierFactor
+from sklearn.preprocessing import RobustScaler
+from sklearn.pipeline import make_pipeline
 import joblib
+from joblib import parallel_backend
+
+# Optional: ONNX export of scaler + forest for faster inference
+ONNX_EXPORT_AVAILABLE = False
+try:
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+    ONNX_EXPORT_AVAILABLE = True
+except ImportError:
+    pass
+
+# Optional: multithreaded Arrow CSV parser for the COPY streams
+PYARROW_AVAILABLE = False
+try:
+    import pyarrow
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pass
+
+# Optional: lz4 for joblib dumps that decompress at near-memcpy speed
+LZ4_AVAILABLE = False
+try:
+    import lz4
+    LZ4_AVAILABLE = True
+except ImportError:
+    pass
+
+# Optional: orjson encodes the JSON artifacts straight to bytes
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
+
+# Compression for the small joblib dumps (scaler, metadata); zlib if lz4 is missing
+JOBLIB_COMPRESS = ('lz4', 3) if LZ4_AVAILABLE else 3
 
 # Database
 import psycopg2
-from psycopg2.extras import RealDictCursor
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -64,39 +110,187 @@ def get_db_connection():
 # FEATURE EXTRACTION
 # ============================================================
 
+# Column dtypes for the transactions COPY stream (compact types, and keep
+# identifier-like strings from being parsed as numbers). NUMERIC(18,2) money
+# columns stay float64: they are compared against float64 profile/history
+# values, and float32 would round most two-decimal amounts
+TRANSACTION_DTYPES = {
+    'transaction_id': 'int32',
+    'account_id': 'int32',
+    'txn_type': 'category',
+    'amount': 'float64',
+    'balance_after': 'float64',
+    'receiver_name': 'category',
+    'receiver_account': str,
+    'receiver_label': 'category',
+    'txn_date': str,
+    'txn_time': str,
+    'branch_code': str,
+    'account_number': str,
+    'current_balance': 'float64',
+    'account_status': 'category',
+    'created_at': str,
+    'account_created_at': str,
+    'prev_created_at': str,
+    'txn_count_24h': 'int32',
+    'txn_count_7d': 'int32',
+    'hist_avg_amount': 'float64',
+    'hist_std_amount': 'float64',
+    'hist_max_amount': 'float64'
+}
+
+# Transactions joined with account info. Ordered by account so the rows
+# can be streamed and featurised one account at a time
+TRANSACTIONS_QUERY = """
+SELECT 
+    t.transaction_id,
+    t.account_id,
+    t.txn_type,
+    t.amount,
+    t.balance_after,
+    t.receiver_name,
+    t.receiver_account,
+    t.receiver_label,
+    t.txn_date,
+    t.txn_time,
+    t.branch_code,
+    t.txn_number,
+    t.created_at,
+    a.account_number,
+    a.holder_name,
+    a.balance as current_balance,
+    a.status as account_status,
+    a.created_at as account_created_at,
+    -- Velocity: earlier transactions of the same account within 24h / 7 days.
+    -- RANGE frames include every row sharing created_at, so the tied rows
+    -- that come later in (created_at, transaction_id) order are taken off
+    CASE WHEN t.created_at IS NULL THEN 0 ELSE
+        COUNT(*) OVER (PARTITION BY t.account_id ORDER BY t.created_at
+                       RANGE BETWEEN INTERVAL '24 hours' PRECEDING AND CURRENT ROW)
+        - COUNT(*) OVER (PARTITION BY t.account_id, t.created_at ORDER BY t.transaction_id
+                         ROWS BETWEEN CURRENT ROW AND UNBOUNDED FOLLOWING)
+    END as txn_count_24h,
+    CASE WHEN t.created_at IS NULL THEN 0 ELSE
+        COUNT(*) OVER (PARTITION BY t.account_id ORDER BY t.created_at
+                       RANGE BETWEEN INTERVAL '168 hours' PRECEDING AND CURRENT ROW)
+        - COUNT(*) OVER (PARTITION BY t.account_id, t.created_at ORDER BY t.transaction_id
+                         ROWS BETWEEN CURRENT ROW AND UNBOUNDED FOLLOWING)
+    END as txn_count_7d,
+    LAG(t.created_at) OVER w_account as prev_created_at,
+    -- Amount history: stats over the account's earlier transactions only
+    AVG(t.amount) OVER w_history as hist_avg_amount,
+    STDDEV_SAMP(t.amount) OVER w_history as hist_std_amount,
+    MAX(t.amount) OVER w_history as hist_max_amount
+FROM transactions t
+JOIN accounts a ON t.account_id = a.account_id
+WINDOW w_account AS (PARTITION BY t.account_id ORDER BY t.created_at, t.transaction_id),
+       w_history AS (w_account ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+ORDER BY t.account_id, t.created_at, t.transaction_id
+"""
+
+# Rows per chunk when streaming transactions for feature extraction
+TRANSACTION_CHUNK_SIZE = 200_000
+
+# Timestamp columns, parsed to UTC once at load time
+TRANSACTION_DATE_COLUMNS = ['txn_date', 'created_at', 'account_created_at', 'prev_created_at']
+
+NS_PER_DAY = 86_400_000_000_000
+
+
+def whole_days_between(later: pd.Series, earlier: pd.Series) -> pd.Series:
+    """Whole days from earlier to later (like Timedelta.days), NaN if either is missing"""
+    later_ns = later.to_numpy(dtype='datetime64[ns]').view('i8')
+    earlier_ns = earlier.to_numpy(dtype='datetime64[ns]').view('i8')
+    days = pd.Series((later_ns - earlier_ns) // NS_PER_DAY, index=later.index)
+    return days.where(later.notna() & earlier.notna())
+
+
+# INT[] columns of customer_profiles (COPY renders them as '{9,10,11}')
+PROFILE_ARRAY_COLUMNS = ['usual_days_of_week', 'usual_hours']
+
+
+def parse_int_array(text) -> Optional[List[int]]:
+    """Parse a Postgres INT[] literal from a COPY stream into a list (None for NULL)"""
+    if not isinstance(text, str):
+        return None
+    return [int(v) for v in text.strip('{}').split(',') if v and v != 'NULL']
+
+
+# Bit h set = hour h is a usual hour. Business hours (9am-5pm) are the
+# fallback when a profile has no usual hours
+BUSINESS_HOURS_MASK = sum(1 << h for h in range(9, 18))
+
+
+def usual_hours_mask(usual_hours) -> int:
+    """Encode a profile's usual_hours list as a 24-bit mask"""
+    if not usual_hours:
+        return BUSINESS_HOURS_MASK
+    if not isinstance(usual_hours, list):
+        return 0
+    return sum(1 << h for h in set(usual_hours) if 0 <= h < 24)
+
+
 class FeatureExtractor:
     """Extract features from database for fraud detection"""
     
     def __init__(self, conn):
         self.conn = conn
     
-    def get_all_transactions(self) -> pd.DataFrame:
-        """Fetch all transactions with account info"""
-        query = """
-        SELECT 
-            t.transaction_id,
-            t.account_id,
-            t.txn_type,
-            t.amount,
-            t.balance_after,
-            t.receiver_name,
-            t.receiver_account,
-            t.receiver_label,
-            t.txn_date,
-            t.txn_time,
-            t.branch_code,
-            t.txn_number,
-            t.created_at,
-            a.account_number,
-            a.holder_name,
-            a.balance as current_balance,
-            a.status as account_status,
-            a.created_at as account_created_at
-        FROM transactions t
-        JOIN accounts a ON t.account_id = a.account_id
-        ORDER BY t.account_id, t.created_at
+    def _copy_query(self, query: str, dtype: Optional[Dict] = None) -> pd.DataFrame:
+        """
+        Run a query through COPY ... TO STDOUT and parse the CSV stream with pandas.
+        Avoids building a Python object per row/cell like a DB-API cursor does.
+        Uses the Arrow CSV reader when pyarrow is installed.
+        """
+        copy_sql = f"COPY ({query}) TO STDOUT WITH CSV HEADER"
+        with self.conn.cursor() as cur, io.BytesIO() as buf:
+            cur.copy_expert(copy_sql, buf)
+            buf.seek(0)
+            engine = 'pyarrow' if PYARROW_AVAILABLE else 'c'
+            return pd.read_csv(buf, dtype=dtype, engine=engine)
+    
+    def _copy_query_chunks(self, query: str, chunksize: int, dtype: Optional[Dict] = None):
+        """
+        Like _copy_query, but spools the COPY stream to a temporary file and
+        yields it back in chunks of rows, so only one chunk is parsed in memory
+        
+        Always parses with the C engine: pandas' pyarrow engine does not support
+        chunksize. This gives up the multithreaded Arrow parse _copy_query uses
+        in exchange for peak memory bounded by one chunk instead of the table.
+        """
+        copy_sql = f"COPY ({query}) TO STDOUT WITH CSV HEADER"
+        with self.conn.cursor() as cur, tempfile.TemporaryFile() as buf:
+            cur.copy_expert(copy_sql, buf)
+            buf.seek(0)
+            with pd.read_csv(buf, dtype=dtype, chunksize=chunksize) as reader:
+                yield from reader
+    
+    def iter_transactions(self, chunksize: int = TRANSACTION_CHUNK_SIZE):
         """
-        return pd.read_sql(query, self.conn)
+        Stream transactions in chunks that always hold complete accounts
+        
+        Relies on the query's ORDER BY account_id: rows of the last account
+        in a chunk are held back and prepended to the next chunk.
+        """
+        carry = None
+        for chunk in self._copy_query_chunks(TRANSACTIONS_QUERY, chunksize, dtype=TRANSACTION_DTYPES):
+            if chunk.empty:
+                continue
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            last_account = chunk['account_id'].iloc[-1]
+            complete = chunk['account_id'] != last_account
+            carry = chunk[~complete]
+            if complete.any():
+                yield self._parse_transaction_dates(chunk[complete].copy())
+        if carry is not None and len(carry) > 0:
+            yield self._parse_transaction_dates(carry.copy())
+    
+    @staticmethod
+    def _parse_transaction_dates(df: pd.DataFrame) -> pd.DataFrame:
+        for col in TRANSACTION_DATE_COLUMNS:
+            df[col] = pd.to_datetime(df[col], utc=True, format='ISO8601')
+        return df
     
     def get_customer_profiles(self) -> pd.DataFrame:
         """Fetch customer profile statistics"""
@@ -119,7 +313,11 @@ class FeatureExtractor:
             cp.risk_score
         FROM customer_profiles cp
         """
-        return pd.read_sql(query, self.conn)
+        profiles = self._copy_query(query, dtype={col: str for col in PROFILE_ARRAY_COLUMNS})
+        for col in PROFILE_ARRAY_COLUMNS:
+            profiles[col] = profiles[col].map(parse_int_array)
+        profiles['usual_hours_mask'] = profiles['usual_hours'].map(usual_hours_mask).astype('uint32')
+        return profiles
     
     def get_cheque_bounces(self) -> pd.DataFrame:
         """Get bounce history per account"""
@@ -131,189 +329,197 @@ class FeatureExtractor:
         JOIN cheques c ON cb.cheque_id = c.cheque_id
         GROUP BY c.drawer_account_id
         """
-        return pd.read_sql(query, self.conn)
+        return self._copy_query(query)
     
-    def compute_features_for_transaction(self, txn: pd.Series, 
-                                          profile: Optional[pd.Series],
-                                          txn_history: pd.DataFrame) -> Dict:
+    def compute_features(self, transactions: pd.DataFrame,
+                         profiles: pd.DataFrame) -> pd.DataFrame:
         """
-        Compute all 20 features for a single transaction
+        Compute all 20 features for every transaction as column operations
+        
+        Each transaction only sees the account's earlier transactions (its
+        "history"), so running statistics are taken per account and shifted
+        by one row to exclude the current transaction.
         
         Args:
-            txn: Single transaction row
-            profile: Customer profile row (may be None)
-            txn_history: All previous transactions for this account
+            transactions: Transactions joined with account info
+            profiles: Customer profile rows (accounts may be missing)
         
         Returns:
-            Dictionary of feature values
+            DataFrame with one row of feature values per transaction
         """
-        features = {}
+        txns = transactions.sort_values(['account_id', 'created_at']).reset_index(drop=True)
+        
+        account_ids = txns['account_id']
+        n_prior = txns.groupby('account_id', sort=False).cumcount()
+        has_history = n_prior > 0
+        created = txns['created_at']
+        
+        # Profile values aligned to each transaction row
+        profile = profiles.set_index('account_id').reindex(account_ids).reset_index(drop=True)
+        has_profile = account_ids.isin(profiles['account_id'])
+        
+        # Features are written straight into one preallocated float32 matrix
+        out = np.empty((len(txns), len(FEATURE_COLUMNS)), dtype=np.float32)
         
         # === AMOUNT FEATURES (4) ===
-        amount = float(txn['amount'])
-        
-        if profile is not None and profile['stddev_transaction_amt'] > 0:
-            avg_amt = float(profile['avg_transaction_amt'])
-            std_amt = float(profile['stddev_transaction_amt'])
-            max_amt = float(profile['max_transaction_amt'])
-            
-            features['amount_zscore'] = (amount - avg_amt) / std_amt if std_amt > 0 else 0
-            features['amount_to_max_ratio'] = amount / max_amt if max_amt > 0 else 1
-        else:
-            # Compute from history if no profile
-            if len(txn_history) > 0:
-                avg_amt = txn_history['amount'].mean()
-                std_amt = txn_history['amount'].std()
-                max_amt = txn_history['amount'].max()
-                features['amount_zscore'] = (amount - avg_amt) / std_amt if std_amt > 0 else 0
-                features['amount_to_max_ratio'] = amount / max_amt if max_amt > 0 else 1
-            else:
-                features['amount_zscore'] = 0
-                features['amount_to_max_ratio'] = 1
+        amount = txns['amount'].astype('float64')
+        
+        # History stats over earlier rows only (window aggregates from the query)
+        hist_avg = txns['hist_avg_amount']
+        hist_std = txns['hist_std_amount']
+        hist_max = txns['hist_max_amount']
+        
+        use_profile_stats = has_profile & (profile['stddev_transaction_amt'] > 0)
+        avg_amt = profile['avg_transaction_amt'].where(use_profile_stats, hist_avg)
+        std_amt = profile['stddev_transaction_amt'].where(use_profile_stats, hist_std)
+        max_amt = profile['max_transaction_amt'].where(use_profile_stats, hist_max)
+        
+        zscore = ((amount - avg_amt) / std_amt).where(std_amt > 0, 0)
+        max_ratio = (amount / max_amt).where(max_amt > 0, 1)
+        no_stats = ~use_profile_stats & ~has_history
+        out[:, FEATURE_INDEX['amount_zscore']] = zscore.mask(no_stats, 0)
+        out[:, FEATURE_INDEX['amount_to_max_ratio']] = max_ratio.mask(no_stats, 1)
         
         # Balance ratio
-        balance = float(txn['current_balance']) if txn['current_balance'] else 0
-        features['amount_to_balance_ratio'] = amount / balance if balance > 0 else 10
+        balance = txns['current_balance'].astype('float64')
+        out[:, FEATURE_INDEX['amount_to_balance_ratio']] = (amount / balance).where(balance > 0, 10)
         
         # Is above historical max
-        if profile is not None:
-            features['is_above_max'] = 1 if amount > float(profile['max_transaction_amt']) else 0
-        elif len(txn_history) > 0:
-            features['is_above_max'] = 1 if amount > txn_history['amount'].max() else 0
-        else:
-            features['is_above_max'] = 0
+        above_max = amount > profile['max_transaction_amt'].where(has_profile, hist_max)
+        out[:, FEATURE_INDEX['is_above_max']] = (above_max & (has_profile | has_history)).astype(int)
         
         # === PAYEE FEATURES (3) ===
-        receiver = txn['receiver_name']
-        
-        if len(txn_history) > 0 and receiver:
-            past_receivers = txn_history['receiver_name'].dropna().tolist()
-            features['is_new_payee'] = 0 if receiver in past_receivers else 1
-            features['payee_frequency'] = past_receivers.count(receiver)
-            features['unique_payee_ratio'] = len(set(past_receivers)) / len(past_receivers) if past_receivers else 0
-        else:
-            features['is_new_payee'] = 1  # First transaction = new payee
-            features['payee_frequency'] = 0
-            features['unique_payee_ratio'] = 1
+        receiver = txns['receiver_name']
+        # Compare payees by int32 code rather than by string (-1 = missing)
+        receiver_code = pd.Series(pd.factorize(receiver)[0].astype('int32'))
+        known_receiver = receiver_code >= 0
+        
+        payee_seen = receiver_code.groupby([account_ids, receiver_code], sort=False).cumcount()
+        payee_seen = payee_seen.where(known_receiver, 0)
+        first_seen = known_receiver & (payee_seen == 0)
+        past_receivers = known_receiver.groupby(account_ids).cumsum() - known_receiver
+        past_unique = first_seen.groupby(account_ids).cumsum() - first_seen
+        
+        # Only a known receiver with prior history is compared against past payees;
+        # NULL/empty receivers keep the no-history defaults
+        has_payee_history = has_history & receiver.notna() & receiver.ne('')
+        out[:, FEATURE_INDEX['is_new_payee']] = (payee_seen == 0).astype(int).where(has_payee_history, 1)
+        out[:, FEATURE_INDEX['payee_frequency']] = payee_seen.where(has_payee_history, 0)
+        unique_ratio = (past_unique / past_receivers).where(past_receivers > 0, 0)
+        out[:, FEATURE_INDEX['unique_payee_ratio']] = unique_ratio.where(has_payee_history, 1)
         
         # === TIME FEATURES (5) ===
-        # Extract hour and day
-        if txn['txn_time']:
-            if isinstance(txn['txn_time'], str):
-                hour = int(txn['txn_time'].split(':')[0])
-            else:
-                hour = txn['txn_time'].hour
-        elif txn['created_at']:
-            created = pd.to_datetime(txn['created_at'])
-            hour = created.hour
-        else:
-            hour = 12  # Default to noon
-        
-        if txn['txn_date']:
-            if isinstance(txn['txn_date'], str):
-                day_of_week = pd.to_datetime(txn['txn_date']).dayofweek
-            else:
-                day_of_week = txn['txn_date'].weekday()
-        elif txn['created_at']:
-            day_of_week = pd.to_datetime(txn['created_at']).dayofweek
-        else:
-            day_of_week = 2  # Default to Wednesday
-        
-        features['hour_of_day'] = hour
-        features['day_of_week'] = day_of_week
-        features['is_weekend'] = 1 if day_of_week >= 5 else 0
-        features['is_night_transaction'] = 1 if hour < 6 or hour > 21 else 0
-        
-        # Check if unusual hour based on profile
-        if profile is not None and profile['usual_hours']:
-            usual_hours = profile['usual_hours'] if isinstance(profile['usual_hours'], list) else []
-            features['is_unusual_hour'] = 0 if hour in usual_hours else 1
-        else:
-            # Business hours: 9am-5pm
-            features['is_unusual_hour'] = 0 if 9 <= hour <= 17 else 1
+        # Prefer the recorded txn_time/txn_date, fall back to created_at
+        # (txn_time comes back as HH:MM:SS, so the hour is its first two chars)
+        txn_hour = pd.to_numeric(txns['txn_time'].str.slice(0, 2))
+        hour = txn_hour.fillna(created.dt.hour).fillna(12).astype('int8')
+        txn_day = txns['txn_date'].dt.dayofweek
+        day_of_week = txn_day.fillna(created.dt.dayofweek).fillna(2).astype('int8')
+        
+        out[:, FEATURE_INDEX['hour_of_day']] = hour
+        out[:, FEATURE_INDEX['day_of_week']] = day_of_week
+        out[:, FEATURE_INDEX['is_weekend']] = day_of_week >= 5
+        out[:, FEATURE_INDEX['is_night_transaction']] = (hour < 6) | (hour > 21)
+        
+        # Check if unusual hour based on profile (one bit test per row)
+        hours_mask = profile['usual_hours_mask'].where(has_profile, BUSINESS_HOURS_MASK)
+        hours_mask = hours_mask.to_numpy(dtype=np.uint32)
+        out[:, FEATURE_INDEX['is_unusual_hour']] = 1 - ((hours_mask >> hour.to_numpy(dtype=np.uint32)) & 1)
         
         # === VELOCITY FEATURES (4) ===
-        if len(txn_history) > 0:
-            txn_time = pd.to_datetime(txn['created_at'])
-            history_times = pd.to_datetime(txn_history['created_at'])
-            
-            # Transactions in last 24h
-            last_24h = txn_time - timedelta(hours=24)
-            features['txn_count_24h'] = len(history_times[history_times >= last_24h])
-            
-            # Transactions in last 7 days
-            last_7d = txn_time - timedelta(days=7)
-            features['txn_count_7d'] = len(history_times[history_times >= last_7d])
-            
-            # Days since last transaction
-            if len(history_times) > 0:
-                last_txn = history_times.max()
-                features['days_since_last_txn'] = (txn_time - last_txn).days
-            else:
-                features['days_since_last_txn'] = 0
-            
-            # Is dormant (no activity > 90 days)
-            features['is_dormant'] = 1 if features['days_since_last_txn'] > 90 else 0
-        else:
-            features['txn_count_24h'] = 0
-            features['txn_count_7d'] = 0
-            features['days_since_last_txn'] = 0
-            features['is_dormant'] = 0
+        # Window counts and the previous created_at come from the query
+        out[:, FEATURE_INDEX['txn_count_24h']] = txns['txn_count_24h']
+        out[:, FEATURE_INDEX['txn_count_7d']] = txns['txn_count_7d']
+        
+        days_since = whole_days_between(created, txns['prev_created_at'])
+        days_since = days_since.where(has_history, 0)
+        out[:, FEATURE_INDEX['days_since_last_txn']] = days_since
+        out[:, FEATURE_INDEX['is_dormant']] = (days_since > 90).astype(int)
         
         # === ACCOUNT HEALTH FEATURES (3) ===
-        # Account age
-        if txn['account_created_at']:
-            account_created = pd.to_datetime(txn['account_created_at'])
-            txn_time = pd.to_datetime(txn['created_at'])
-            features['account_age_days'] = (txn_time - account_created).days
-        else:
-            features['account_age_days'] = 365  # Default 1 year
+        # Account age (default 1 year when either timestamp is missing)
+        account_age = whole_days_between(created, txns['account_created_at'])
+        out[:, FEATURE_INDEX['account_age_days']] = account_age.fillna(365)
         
         # Bounce rate
-        if profile is not None:
-            features['bounce_rate'] = float(profile['bounce_rate']) / 100 if profile['bounce_rate'] else 0
-        else:
-            features['bounce_rate'] = 0
+        out[:, FEATURE_INDEX['bounce_rate']] = (profile['bounce_rate'].astype('float64') / 100).where(has_profile, 0)
         
         # Average balance (use current as approximation)
-        features['avg_balance'] = float(txn['current_balance']) if txn['current_balance'] else 0
+        out[:, FEATURE_INDEX['avg_balance']] = balance
         
         # === SIGNATURE SCORE (placeholder - will be filled during inference) ===
-        features['signature_score'] = 85  # Default good score for training data
+        out[:, FEATURE_INDEX['signature_score']] = 85  # Default good score for training data
         
-        return features
+        features = pd.DataFrame(out, columns=FEATURE_COLUMNS)
+        return features.assign(
+            transaction_id=txns['transaction_id'],
+            account_id=account_ids,
+            amount=amount,
+            receiver_name=receiver
+        )
     
     def extract_all_features(self) -> pd.DataFrame:
         """Extract features for all transactions in database"""
         print("Loading data from database...")
-        transactions = self.get_all_transactions()
         profiles = self.get_customer_profiles()
+        print(f"Found {len(profiles)} customer profiles")
         
-        print(f"Found {len(transactions)} transactions, {len(profiles)} customer profiles")
-        
-        # Create profile lookup
-        profile_dict = profiles.set_index('account_id').to_dict('index')
-        
-        all_features = []
+        # Stream transactions account-by-account instead of loading the whole join
+        chunks = [self.compute_features(transactions, profiles)
+                  for transactions in self.iter_transactions()]
+        if not chunks:
+            return pd.DataFrame()
+        features = pd.concat(chunks, ignore_index=True)
         
-        for account_id in transactions['account_id'].unique():
-            account_txns = transactions[transactions['account_id'] == account_id].sort_values('created_at')
-            profile = pd.Series(profile_dict.get(account_id, {})) if account_id in profile_dict else None
-            
-            for idx, (_, txn) in enumerate(account_txns.iterrows()):
-                # Get history (all transactions before this one)
-                history = account_txns.iloc[:idx]
-                
-                # Extract features
-                features = self.compute_features_for_transaction(txn, profile, history)
-                features['transaction_id'] = txn['transaction_id']
-                features['account_id'] = account_id
-                features['amount'] = float(txn['amount'])
-                features['receiver_name'] = txn['receiver_name']
-                
-                all_features.append(features)
-        
-        return pd.DataFrame(all_features)
+        print(f"Found {len(features)} transactions")
+        return features
+    
+    def get_data_version(self) -> Tuple:
+        """
+        Fingerprint of the tables features are built from: a row count and an
+        order-independent sum of whole-row hashes per table, so inserts,
+        deletes and in-place UPDATEs (balance, bounce_rate, usual_hours, ...)
+        all change it. One sequential scan per table, no feature computation.
+        """
+        query = """
+            SELECT
+                (SELECT COUNT(*) FROM transactions),
+                (SELECT SUM(hashtext(t::text)) FROM transactions t),
+                (SELECT COUNT(*) FROM accounts),
+                (SELECT SUM(hashtext(a::text)) FROM accounts a),
+                (SELECT COUNT(*) FROM customer_profiles),
+                (SELECT SUM(hashtext(cp::text)) FROM customer_profiles cp),
+                (SELECT COUNT(*) FROM cheque_bounces)
+        """
+        with self.conn.cursor() as cur:
+            cur.execute(query)
+            return tuple(cur.fetchone())
+
+
+# Extracted features are cached on disk between training runs, keyed by the
+# database's data version, so an unchanged database skips the SQL entirely
+FEATURE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+feature_cache = joblib.Memory(FEATURE_CACHE_DIR, verbose=0)
+
+
+def feature_code_version() -> str:
+    """
+    Hash of this module's source. Features depend on more than
+    FeatureExtractor (dtypes, the query, date helpers, FEATURE_COLUMNS/INDEX,
+    ...), so any edit to the module invalidates features cached by an older
+    version rather than risking a stale hit.
+    """
+    return hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+
+
+@feature_cache.cache(ignore=['extractor'])
+def extract_features_cached(extractor: FeatureExtractor, data_version: Tuple,
+                            code_version: str) -> pd.DataFrame:
+    """
+    extract_all_features, memoized on data_version (see
+    FeatureExtractor.get_data_version) and code_version (see feature_code_version)
+    """
+    return extractor.extract_all_features()
 
 
 # ============================================================
@@ -329,19 +535,11 @@ def analyze_data_distribution(df: pd.DataFrame) -> Dict:
     print("DATA DISTRIBUTION ANALYSIS")
     print("="*60)
     
-    stats = {}
-    
-    for col in FEATURE_COLUMNS:
-        if col in df.columns:
-            stats[col] = {
-                'mean': df[col].mean(),
-                'std': df[col].std(),
-                'min': df[col].min(),
-                'max': df[col].max(),
-                'median': df[col].median(),
-                'q25': df[col].quantile(0.25),
-                'q75': df[col].quantile(0.75)
-            }
+    # All per-feature summaries in one describe() pass
+    columns = [col for col in FEATURE_COLUMNS if col in df.columns]
+    summary = df[columns].describe(percentiles=[0.25, 0.5, 0.75]).T
+    summary = summary.rename(columns={'50%': 'median', '25%': 'q25', '75%': 'q75'})
+    stats = summary[['mean', 'std', 'min', 'max', 'median', 'q25', 'q75']].to_dict('index')
     
     # Print summary for key features
     print("\nKey Feature Statistics:")
@@ -368,19 +566,20 @@ def compute_feature_contributions(model: IsolationForest, X: np.ndarray,
     # Get baseline anomaly scores
     baseline_scores = -model.score_samples(X)  # Negative because lower = more anomalous
     
-    importances = []
+    # One copy of X per feature, each with that feature's column permuted,
+    # so all variants are scored in a single pass over the trees
+    n_samples, n_features = X.shape
+    perm = np.random.permutation(n_samples)
+    X_permuted = np.tile(X, (n_features, 1))
+    for i in range(n_features):
+        X_permuted[i * n_samples:(i + 1) * n_samples, i] = X[perm, i]
     
-    for i, feat_name in enumerate(feature_names):
-        # Permute this feature
-        X_permuted = X.copy()
-        np.random.shuffle(X_permuted[:, i])
-        
-        # Get new scores
-        permuted_scores = -model.score_samples(X_permuted)
-        
-        # Importance = how much scores change when feature is randomized
-        importance = np.mean(np.abs(permuted_scores - baseline_scores))
-        importances.append({'feature': feat_name, 'importance': importance})
+    permuted_scores = -model.score_samples(X_permuted).reshape(n_features, n_samples)
+    
+    # Importance = how much scores change when feature is randomized
+    importance = np.abs(permuted_scores - baseline_scores).mean(axis=1)
+    importances = [{'feature': feat_name, 'importance': importance[i]}
+                   for i, feat_name in enumerate(feature_names)]
     
     importance_df = pd.DataFrame(importances).sort_values('importance', ascending=False)
     return importance_df
@@ -406,6 +605,9 @@ FEATURE_COLUMNS = [
     'signature_score'
 ]
 
+# Column position of each feature in the feature matrix
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
 # Anomaly score thresholds
 THRESHOLDS = {
     'high_risk': 0.7,      # Score >= 0.7 → High risk, likely fraud
@@ -414,6 +616,14 @@ THRESHOLDS = {
     # Score < 0.3 → Normal transaction
 }
 
+# Risk level for each threshold band, lowest first (used with np.searchsorted)
+RISK_LEVELS = ['normal', 'low_risk', 'medium_risk', 'high_risk']
+RISK_BOUNDARIES = [THRESHOLDS['low_risk'], THRESHOLDS['medium_risk'], THRESHOLDS['high_risk']]
+
+# Batches at least this large are scored with a threaded joblib backend;
+# below it, starting the pool costs more than it saves (e.g. one cheque)
+PARALLEL_SCORING_MIN_ROWS = 1000
+
 
 def train_isolation_forest(df: pd.DataFrame, contamination: float = 0.05) -> Tuple[IsolationForest, RobustScaler, Dict]:
     """
@@ -440,10 +650,15 @@ def train_isolation_forest(df: pd.DataFrame, contamination: float = 0.05) -> Tup
     print("="*60)
     
     # Prepare features
-    X = df[FEATURE_COLUMNS].copy()
+    # Isolation Forest builds its trees in float32, so hand it a float32 array
+    # directly instead of a DataFrame it would have to copy and downcast.
+    # DataFrame.to_numpy comes back column-major; the trees read row by row
+    X = np.ascontiguousarray(df[FEATURE_COLUMNS].to_numpy(dtype=np.float32))
     
-    # Handle any NaN values
-    X = X.fillna(0)
+    # Handle any NaN values (in place, no extra copy). Infinities are left
+    # as they are, like fillna(0), so the scaler rejects them loudly instead
+    # of training on +/-float max
+    np.nan_to_num(X, copy=False, nan=0.0, posinf=np.inf, neginf=-np.inf)
     
     print(f"\nDataset size: {len(X)} transactions")
     print(f"Features: {len(FEATURE_COLUMNS)}")
@@ -451,8 +666,18 @@ def train_isolation_forest(df: pd.DataFrame, contamination: float = 0.05) -> Tup
     
     # Use RobustScaler - better for data with outliers
     # It uses median and IQR instead of mean and std
-    scaler = RobustScaler()
-    X_scaled = scaler.fit_transform(X)
+    scaler = RobustScaler(copy=False)  # Scale X in place
+    scaler.fit(X)
+    
+    # Keep the scaler parameters in float32 (scale_ comes out float64) so
+    # training and inference scale in the same precision
+    scaler.scale_ = scaler.scale_.astype(np.float32)
+    scaler.center_ = scaler.center_.astype(np.float32)
+    X_scaled = scaler.transform(X)
+    
+    # In-place scaling was only for the training matrix we own; the saved
+    # scaler must not overwrite its callers' arrays on transform
+    scaler.copy = True
     
     # Train Isolation Forest
     # Key parameters:
@@ -469,7 +694,7 @@ def train_isolation_forest(df: pd.DataFrame, contamination: float = 0.05) -> Tup
     
     model = IsolationForest(
         n_estimators=200,           # Number of trees in the forest
-        max_samples='auto',          # Use 256 or n_samples, whichever is smaller
+        max_samples=min(256, len(X_scaled)),  # 256 per tree (original paper), or all if fewer
         contamination=contamination, # Expected proportion of outliers
         max_features=1.0,            # Use all features
         bootstrap=False,             # Sample without replacement
@@ -488,9 +713,11 @@ def train_isolation_forest(df: pd.DataFrame, contamination: float = 0.05) -> Tup
     # Convert to 0-1 anomaly score
     # Raw scores typically range from -0.5 (anomaly) to 0.0 (normal)
     # We transform: anomaly_score = 1 - (raw_score - min) / (max - min)
+    # (done in place on the raw score buffer, no temporaries)
     min_score = raw_scores.min()
     max_score = raw_scores.max()
-    anomaly_scores = (max_score - raw_scores) / (max_score - min_score)
+    anomaly_scores = np.subtract(max_score, raw_scores, out=raw_scores)
+    anomaly_scores /= max_score - min_score
     
     # Add scores to dataframe for analysis
     df_with_scores = df.copy()
@@ -533,9 +760,9 @@ def train_isolation_forest(df: pd.DataFrame, contamination: float = 0.05) -> Tup
     importance_df = compute_feature_contributions(model, X_scaled, FEATURE_COLUMNS)
     
     print(f"\nTop 10 Most Important Features for Anomaly Detection:")
-    for i, (_, row) in enumerate(importance_df.head(10).iterrows()):
-        bar = "█" * int(row['importance'] * 50)
-        print(f"  {i+1}. {row['feature']}: {row['importance']:.4f} {bar}")
+    for i, (feature, importance) in enumerate(importance_df.head(10).itertuples(index=False, name=None)):
+        bar = "█" * int(importance * 50)
+        print(f"  {i+1}. {feature}: {importance:.4f} {bar}")
     
     # Analyze what makes anomalies different
     if n_anomalies > 0:
@@ -569,88 +796,315 @@ def train_isolation_forest(df: pd.DataFrame, contamination: float = 0.05) -> Tup
     return model, scaler, metrics
 
 
+class FeatureVector:
+    """
+    Features of a single transaction, written straight into a (1, n_features)
+    float32 row in FEATURE_COLUMNS order so scoring needs no dict conversion.
+    
+    Features are set as attributes (fv.amount_zscore = 1.2) or keyword
+    arguments. Unset features behave like missing keys in a feature dict:
+    they are scored as 0, and get() returns the caller's default for them
+    (so explain_anomalies applies the same ANOMALY_RULE_DEFAULTS).
+    """
+    __slots__ = ('arr', 'is_set')
+    
+    def __init__(self, **features):
+        object.__setattr__(self, 'arr', np.zeros((1, len(FEATURE_COLUMNS)), dtype=np.float32))
+        object.__setattr__(self, 'is_set', np.zeros(len(FEATURE_COLUMNS), dtype=bool))
+        for name, value in features.items():
+            setattr(self, name, value)
+    
+    def __setattr__(self, name: str, value: float):
+        try:
+            index = FEATURE_INDEX[name]
+        except KeyError:
+            raise AttributeError(f"Unknown feature: {name}") from None
+        self.arr[0, index] = value
+        self.is_set[index] = True
+    
+    def __getattr__(self, name: str) -> float:
+        try:
+            return self.arr[0, FEATURE_INDEX[name]]
+        except KeyError:
+            raise AttributeError(f"Unknown feature: {name}") from None
+    
+    # Read-only dict interface over the set features, so explain_anomalies
+    # treats a FeatureVector exactly like the equivalent feature dict
+    def __getitem__(self, name: str) -> float:
+        index = FEATURE_INDEX[name]
+        if not self.is_set[index]:
+            raise KeyError(name)
+        return self.arr[0, index]
+    
+    def get(self, name: str, default: float = None) -> float:
+        index = FEATURE_INDEX.get(name)
+        if index is None or not self.is_set[index]:
+            return default
+        return self.arr[0, index]
+
+
+def features_to_array(features_list: List[Dict]) -> np.ndarray:
+    """Stack feature dictionaries into a float32 matrix in FEATURE_COLUMNS order"""
+    n_features = len(FEATURE_COLUMNS)
+    X = np.fromiter((features.get(col, 0) for features in features_list for col in FEATURE_COLUMNS),
+                    dtype=np.float32, count=len(features_list) * n_features)
+    return X.reshape(len(features_list), n_features)
+
+
+def predict_from_array(model: IsolationForest, scaler: RobustScaler,
+                       X: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """
+    Score a float32 feature matrix (columns in FEATURE_COLUMNS order)
+    
+    Returns:
+        anomaly_scores: Array of scores (0-1, higher = more anomalous)
+        risk_levels: Risk level name for each row
+    """
+    # C-contiguous float32 rows, the layout the tree traversal reads without converting
+    X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+    
+    # Same as scaler.transform, without sklearn's per-call validation.
+    # center_/scale_ are already float32 (cast at fit and at load_model)
+    X_scaled = X
+    if scaler.center_ is not None:
+        X_scaled = X_scaled - scaler.center_
+    if scaler.scale_ is not None:
+        X_scaled = X_scaled / scaler.scale_
+    
+    # Get raw scores and convert to 0-1 scale
+    # Isolation Forest scores: more negative = more anomalous
+    # Typical range: -0.5 (anomaly) to 0.0 (normal)
+    # We map to 0-1 where 1 = most anomalous
+    # For large batches: threads share X, so the trees are walked in parallel
+    # without the per-worker input copies a process backend would make
+    if len(X_scaled) >= PARALLEL_SCORING_MIN_ROWS:
+        with parallel_backend('threading', n_jobs=-1):
+            raw_scores = model.score_samples(X_scaled)
+    else:
+        raw_scores = model.score_samples(X_scaled)
+    anomaly_scores = np.clip(0.5 - raw_scores, 0, 1)
+    
+    # Determine risk levels: index of the highest threshold each score reaches
+    levels = np.searchsorted(RISK_BOUNDARIES, anomaly_scores, side='right')
+    
+    return anomaly_scores, [RISK_LEVELS[level] for level in levels]
+
+
+def predict_anomaly_scores(model: IsolationForest, scaler: RobustScaler,
+                           features_list: List[Dict]) -> List[Tuple[float, str, List[str]]]:
+    """
+    Predict anomaly scores for a batch of transactions
+    
+    Scales and scores the whole batch in one call, which is much cheaper
+    per transaction than scoring them one at a time.
+    
+    Args:
+        model: Trained Isolation Forest model
+        scaler: Fitted scaler
+        features_list: List of feature dictionaries, one per transaction
+    
+    Returns:
+        List of (score, risk_level, reasons) tuples, see predict_anomaly_score
+    """
+    if not features_list:
+        return []
+    
+    anomaly_scores, risk_levels = predict_from_array(model, scaler, features_to_array(features_list))
+    reasons = explain_anomalies(features_list)
+    
+    return [(float(score), risk_level, reason)
+            for score, risk_level, reason in zip(anomaly_scores, risk_levels, reasons)]
+
+
 def predict_anomaly_score(model: IsolationForest, scaler: RobustScaler, 
-                          features: Dict) -> Tuple[float, str, List[str]]:
+                          features: Union[Dict, FeatureVector]) -> Tuple[float, str, List[str]]:
     """
     Predict anomaly score for a single transaction
     
     Args:
         model: Trained Isolation Forest model
         scaler: Fitted scaler
-        features: Dictionary of feature values
+        features: Dictionary of feature values, or a FeatureVector
+                  (scored from its array without conversion)
     
     Returns:
         score: Anomaly score (0-1, higher = more anomalous)
         risk_level: 'high_risk', 'medium_risk', 'low_risk', or 'normal'
         reasons: List of features contributing to anomaly
     """
-    # Prepare feature vector
-    X = np.array([[features.get(col, 0) for col in FEATURE_COLUMNS]])
-    X_scaled = scaler.transform(X)
-    
-    # Get raw score and convert to 0-1 scale
-    raw_score = model.score_samples(X_scaled)[0]
+    if isinstance(features, FeatureVector):
+        anomaly_scores, risk_levels = predict_from_array(model, scaler, features.arr)
+        return float(anomaly_scores[0]), risk_levels[0], explain_anomaly(features)
+    return predict_anomaly_scores(model, scaler, [features])[0]
+
+
+# Contributing-factor rules: (feature defaults, flag over feature columns, message)
+# Flags are evaluated on whole columns; messages are only built for flagged rows
+ANOMALY_RULE_DEFAULTS = {
+    'amount_zscore': 0, 'is_new_payee': 0, 'amount_to_max_ratio': 0,
+    'is_night_transaction': 0, 'txn_count_24h': 0, 'is_dormant': 0,
+    'signature_score': 100, 'amount_to_balance_ratio': 0
+}
+ANOMALY_RULES = [
+    (lambda v: v['amount_zscore'] > 2,
+     lambda f: f"Unusual amount (z-score: {f['amount_zscore']:.2f})"),
+    (lambda v: (v['is_new_payee'] == 1) & (v['amount_to_max_ratio'] > 1.5),
+     lambda f: "Large payment to new payee"),
+    (lambda v: v['is_night_transaction'] == 1,
+     lambda f: "Night-time transaction"),
+    (lambda v: v['txn_count_24h'] > 3,
+     lambda f: f"High velocity ({f['txn_count_24h']:.0f} txns in 24h)"),
+    (lambda v: v['is_dormant'] == 1,
+     lambda f: "Previously dormant account"),
+    (lambda v: v['signature_score'] < 70,
+     lambda f: f"Low signature confidence ({f['signature_score']:.0f}%)"),
+    (lambda v: v['amount_to_balance_ratio'] > 0.8,
+     lambda f: f"High amount relative to balance ({f['amount_to_balance_ratio']*100:.0f}%)"),
+]
+
+
+def explain_anomalies(features_list: List[Dict]) -> List[List[str]]:
+    """Find contributing factors (features with extreme values) for a batch"""
+    values = {
+        col: np.fromiter((features.get(col, default) for features in features_list),
+                         dtype=np.float64, count=len(features_list))
+        for col, default in ANOMALY_RULE_DEFAULTS.items()
+    }
+    flags = np.column_stack([flag(values) for flag, _ in ANOMALY_RULES])
     
-    # Convert raw score to anomaly score
-    # Isolation Forest scores: more negative = more anomalous
-    # Typical range: -0.5 (anomaly) to 0.0 (normal)
-    # We map to 0-1 where 1 = most anomalous
-    anomaly_score = max(0, min(1, 0.5 - raw_score))
-    
-    # Determine risk level
-    if anomaly_score >= THRESHOLDS['high_risk']:
-        risk_level = 'high_risk'
-    elif anomaly_score >= THRESHOLDS['medium_risk']:
-        risk_level = 'medium_risk'
-    elif anomaly_score >= THRESHOLDS['low_risk']:
-        risk_level = 'low_risk'
-    else:
-        risk_level = 'normal'
-    
-    # Find contributing factors (features with extreme values)
-    reasons = []
-    if features.get('amount_zscore', 0) > 2:
-        reasons.append(f"Unusual amount (z-score: {features['amount_zscore']:.2f})")
-    if features.get('is_new_payee', 0) == 1 and features.get('amount_to_max_ratio', 0) > 1.5:
-        reasons.append("Large payment to new payee")
-    if features.get('is_night_transaction', 0) == 1:
-        reasons.append("Night-time transaction")
-    if features.get('txn_count_24h', 0) > 3:
-        reasons.append(f"High velocity ({features['txn_count_24h']} txns in 24h)")
-    if features.get('is_dormant', 0) == 1:
-        reasons.append("Previously dormant account")
-    if features.get('signature_score', 100) < 70:
-        reasons.append(f"Low signature confidence ({features['signature_score']:.0f}%)")
-    if features.get('amount_to_balance_ratio', 0) > 0.8:
-        reasons.append(f"High amount relative to balance ({features['amount_to_balance_ratio']*100:.0f}%)")
-    
-    return anomaly_score, risk_level, reasons
+    reasons = [[] for _ in features_list]
+    for i in np.flatnonzero(flags.any(axis=1)):
+        reasons[i] = [message(features_list[i])
+                      for (_, message), hit in zip(ANOMALY_RULES, flags[i]) if hit]
+    return reasons
+
+
+def explain_anomaly(features: Dict) -> List[str]:
+    """Find contributing factors (features with extreme values)"""
+    return explain_anomalies([features])[0]
 
 
 # ============================================================
 # SAVE MODEL
 # ============================================================
 
-def save_model(model: IsolationForest, scaler: RobustScaler, metrics: Dict, output_dir: str):
-    """Save trained model, scaler, and metadata"""
-    os.makedirs(output_dir, exist_ok=True)
-    
-    model_path = os.path.join(output_dir, 'anomaly_model.pkl')
-    scaler_path = os.path.join(output_dir, 'anomaly_scaler.pkl')
-    features_path = os.path.join(output_dir, 'anomaly_features.txt')
-    metadata_path = os.path.join(output_dir, 'anomaly_metadata.pkl')
-    
-    # Save model
-    joblib.dump(model, model_path)
-    print(f"\n✓ Model saved to: {model_path}")
-    
-    # Save scaler
-    joblib.dump(scaler, scaler_path)
-    print(f"✓ Scaler saved to: {scaler_path}")
-    
-    # Save feature list
-    with open(features_path, 'w') as f:
-        f.write('\n'.join(FEATURE_COLUMNS))
+@contextmanager
+def atomic_path(path: str):
+    """
+    Yield a temporary path next to `path`, then rename it over `path`.
+    os.replace is atomic, so loaders never see a half-written file and
+    readers that already mapped the old file keep it until they reload.
+    The temp name is unique per call, so concurrent saves into the same
+    directory never write to (or publish) each other's partial files.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def dump_atomic(obj, path: str, compress=0):
+    """joblib.dump through atomic_path, with pickle protocol 5"""
+    with atomic_path(path) as tmp_path:
+        joblib.dump(obj, tmp_path, compress=compress, protocol=5)
+
+
+def convert_to_onnx(model: IsolationForest, scaler: RobustScaler) -> bytes:
+    """Serialize scaler + forest as one ONNX graph (scored by onnxruntime in fraud_prediction.py)"""
+    onx = convert_sklearn(
+        make_pipeline(scaler, model),
+        initial_types=[('input', FloatTensorType([None, len(FEATURE_COLUMNS)]))],
+        target_opset={'': 17, 'ai.onnx.ml': 3}
+    )
+    return onx.SerializeToString()
+
+
+class SaveTargets(NamedTuple):
+    """Paths of every artifact save_model writes, joined once per output directory"""
+    output_dir: str
+    model: str
+    scaler: str
+    scaler_params: str
+    features: str
+    metadata: str
+    onnx: str
+    
+    @classmethod
+    @lru_cache(maxsize=32)
+    def in_dir(cls, output_dir: str) -> 'SaveTargets':
+        # Cached: repeated saves to the same directory (e.g. parameter sweeps)
+        # reuse the same immutable tuple instead of re-joining every path
+        return cls(
+            output_dir=output_dir,
+            model=os.path.join(output_dir, 'anomaly_model.pkl'),
+            scaler=os.path.join(output_dir, 'anomaly_scaler.pkl'),
+            scaler_params=os.path.join(output_dir, 'anomaly_scaler.npz'),
+            features=os.path.join(output_dir, 'anomaly_features.json'),
+            metadata=os.path.join(output_dir, 'anomaly_metadata.pkl'),
+            onnx=os.path.join(output_dir, 'anomaly_model.onnx')
+        )
+
+
+def save_model(model: IsolationForest, scaler: RobustScaler, metrics: Dict,
+               output_dir: Union[str, SaveTargets]):
+    """Save trained model, scaler, and metadata (to a directory or precomputed SaveTargets)"""
+    targets = output_dir if isinstance(output_dir, SaveTargets) else SaveTargets.in_dir(output_dir)
+    if not os.path.isdir(targets.output_dir):
+        os.makedirs(targets.output_dir, exist_ok=True)
+    
+    model_path = targets.model
+    scaler_path = targets.scaler
+    scaler_params_path = targets.scaler_params
+    features_path = targets.features
+    metadata_path = targets.metadata
+    onnx_path = targets.onnx
+    
+    # The forest pickle, ONNX conversion and scaler pickle are independent,
+    # so they run in threads (joblib/zlib release the GIL while writing)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        # Save model uncompressed: joblib can only memory-map arrays from
+        # uncompressed files, and the loaders map the tree arrays read-only
+        model_saved = pool.submit(dump_atomic, model, model_path, compress=0)
+        onnx_converted = pool.submit(convert_to_onnx, model, scaler) if ONNX_EXPORT_AVAILABLE else None
+        scaler_saved = pool.submit(dump_atomic, scaler, scaler_path, compress=JOBLIB_COMPRESS)
+        
+        model_saved.result()
+        print(f"\n✓ Model saved to: {model_path}")
+        
+        # Written only after the pickle: the loader ignores an ONNX file older than it
+        if onnx_converted is not None:
+            try:
+                onnx_bytes = onnx_converted.result()
+                with atomic_path(onnx_path) as tmp_path:
+                    Path(tmp_path).write_bytes(onnx_bytes)
+                print(f"✓ ONNX model saved to: {onnx_path}")
+            except Exception as e:
+                print(f"⚠️  ONNX export failed: {e}")
+        
+        scaler_saved.result()
+        print(f"✓ Scaler saved to: {scaler_path}")
+    
+    # Scaler parameters as plain arrays: the serving path scales with
+    # (X - center) / scale and loads these without unpickling sklearn objects
+    n_features = len(FEATURE_COLUMNS)
+    center = scaler.center_ if scaler.center_ is not None else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+    with atomic_path(scaler_params_path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, center=center.astype(np.float32), scale=scale.astype(np.float32),
+                     feature_names=np.array(FEATURE_COLUMNS))
+    print(f"✓ Scaler parameters saved to: {scaler_params_path}")
+    
+    # Save feature list as a JSON array (one write call for the whole file)
+    if ORJSON_AVAILABLE:
+        features_json = orjson.dumps(FEATURE_COLUMNS, option=orjson.OPT_INDENT_2)
+    else:
+        features_json = json.dumps(FEATURE_COLUMNS, indent=2).encode()
+    with atomic_path(features_path) as tmp_path:
+        Path(tmp_path).write_bytes(features_json)
     print(f"✓ Features saved to: {features_path}")
     
     # Save metadata (thresholds, metrics, etc.)
@@ -661,7 +1115,7 @@ def save_model(model: IsolationForest, scaler: RobustScaler, metrics: Dict, outp
         'metrics': metrics,
         'trained_at': datetime.now().isoformat()
     }
-    joblib.dump(metadata, metadata_path)
+    dump_atomic(metadata, metadata_path, compress=JOBLIB_COMPRESS)
     print(f"✓ Metadata saved to: {metadata_path}")
 
 
@@ -671,8 +1125,15 @@ def load_model(model_dir: str) -> Tuple[IsolationForest, RobustScaler, Dict]:
     scaler_path = os.path.join(model_dir, 'anomaly_scaler.pkl')
     metadata_path = os.path.join(model_dir, 'anomaly_metadata.pkl')
     
-    model = joblib.load(model_path)
+    model = joblib.load(model_path, mmap_mode='r')
     scaler = joblib.load(scaler_path)
+    
+    # Scalers saved before training kept float32 parameters: cast once here
+    # so predict_from_array scales in float32 without a per-call conversion
+    if scaler.center_ is not None:
+        scaler.center_ = scaler.center_.astype(np.float32, copy=False)
+    if scaler.scale_ is not None:
+        scaler.scale_ = scaler.scale_.astype(np.float32, copy=False)
     metadata = joblib.load(metadata_path)
     
     return model, scaler, metadata
@@ -682,12 +1143,70 @@ def load_model(model_dir: str) -> Tuple[IsolationForest, RobustScaler, Dict]:
 # MAIN
 # ============================================================
 
+# Demo transactions scored at the end of training
+DEMO_NORMAL_TXN = {
+    'amount_zscore': 0.5,
+    'amount_to_max_ratio': 0.6,
+    'amount_to_balance_ratio': 0.2,
+    'is_above_max': 0,
+    'is_new_payee': 0,
+    'payee_frequency': 5,
+    'unique_payee_ratio': 0.4,
+    'hour_of_day': 14,
+    'day_of_week': 2,
+    'is_unusual_hour': 0,
+    'is_weekend': 0,
+    'is_night_transaction': 0,
+    'txn_count_24h': 1,
+    'txn_count_7d': 3,
+    'days_since_last_txn': 2,
+    'is_dormant': 0,
+    'account_age_days': 500,
+    'bounce_rate': 0.01,
+    'avg_balance': 100000,
+    'signature_score': 92
+}
+
+DEMO_SUSPICIOUS_TXN = {
+    'amount_zscore': 4.5,
+    'amount_to_max_ratio': 2.5,
+    'amount_to_balance_ratio': 0.9,
+    'is_above_max': 1,
+    'is_new_payee': 1,
+    'payee_frequency': 0,
+    'unique_payee_ratio': 1.0,
+    'hour_of_day': 3,
+    'day_of_week': 0,
+    'is_unusual_hour': 1,
+    'is_weekend': 0,
+    'is_night_transaction': 1,
+    'txn_count_24h': 5,
+    'txn_count_7d': 8,
+    'days_since_last_txn': 95,
+    'is_dormant': 1,
+    'account_age_days': 100,
+    'bounce_rate': 0.15,
+    'avg_balance': 50000,
+    'signature_score': 55
+}
+
+# The same demo transactions as float32 rows in FEATURE_COLUMNS order,
+# built once so the demo can go straight to predict_from_array
+_NORMAL = features_to_array([DEMO_NORMAL_TXN])[0]
+_SUSPICIOUS = features_to_array([DEMO_SUSPICIOUS_TXN])[0]
+
+
 def main():
-    print("="*60)
-    print("UNSUPERVISED ANOMALY DETECTION MODEL TRAINING")
-    print("Using Isolation Forest - No labeled data required!")
-    print("="*60)
-    print(f"Started at: {datetime.now()}")
+    started_ns = time.monotonic_ns()
+    
+    # Banner blocks are joined and printed with one write each
+    print("\n".join([
+        "="*60,
+        "UNSUPERVISED ANOMALY DETECTION MODEL TRAINING",
+        "Using Isolation Forest - No labeled data required!",
+        "="*60,
+        f"Started at: {datetime.now()}",
+    ]))
     
     # Connect to database
     try:
@@ -701,7 +1220,10 @@ def main():
     if conn:
         # Extract features from database
         extractor = FeatureExtractor(conn)
-        df = extractor.extract_all_features()
+        cache_key = (extractor.get_data_version(), feature_code_version())
+        if extract_features_cached.check_call_in_cache(extractor, *cache_key):
+            print("✓ Database and feature code unchanged since last run, using cached features")
+        df = extract_features_cached(extractor, *cache_key)
         conn.close()
         
         if len(df) == 0:
@@ -723,94 +1245,69 @@ def main():
     model, scaler, metrics = train_isolation_forest(df, contamination=0.05)
     
     # Save model
-    output_dir = os.path.dirname(os.path.abspath(__file__))
-    save_model(model, scaler, metrics, output_dir)
+    targets = SaveTargets.in_dir(os.path.dirname(os.path.abspath(__file__)))
+    save_model(model, scaler, metrics, targets)
     
     # Demo: Test prediction on a sample transaction
-    print("\n" + "="*60)
-    print("DEMO: Testing anomaly detection")
-    print("="*60)
-    
-    # Test a normal transaction
-    normal_txn = {
-        'amount_zscore': 0.5,
-        'amount_to_max_ratio': 0.6,
-        'amount_to_balance_ratio': 0.2,
-        'is_above_max': 0,
-        'is_new_payee': 0,
-        'payee_frequency': 5,
-        'unique_payee_ratio': 0.4,
-        'hour_of_day': 14,
-        'day_of_week': 2,
-        'is_unusual_hour': 0,
-        'is_weekend': 0,
-        'is_night_transaction': 0,
-        'txn_count_24h': 1,
-        'txn_count_7d': 3,
-        'days_since_last_txn': 2,
-        'is_dormant': 0,
-        'account_age_days': 500,
-        'bounce_rate': 0.01,
-        'avg_balance': 100000,
-        'signature_score': 92
-    }
-    
-    score, risk, reasons = predict_anomaly_score(model, scaler, normal_txn)
-    print(f"\nNormal Transaction Test:")
-    print(f"  Anomaly Score: {score:.3f}")
-    print(f"  Risk Level: {risk}")
-    print(f"  Reasons: {reasons if reasons else 'None - appears normal'}")
-    
-    # Test a suspicious transaction
-    suspicious_txn = {
-        'amount_zscore': 4.5,
-        'amount_to_max_ratio': 2.5,
-        'amount_to_balance_ratio': 0.9,
-        'is_above_max': 1,
-        'is_new_payee': 1,
-        'payee_frequency': 0,
-        'unique_payee_ratio': 1.0,
-        'hour_of_day': 3,
-        'day_of_week': 0,
-        'is_unusual_hour': 1,
-        'is_weekend': 0,
-        'is_night_transaction': 1,
-        'txn_count_24h': 5,
-        'txn_count_7d': 8,
-        'days_since_last_txn': 95,
-        'is_dormant': 1,
-        'account_age_days': 100,
-        'bounce_rate': 0.15,
-        'avg_balance': 50000,
-        'signature_score': 55
-    }
-    
-    score, risk, reasons = predict_anomaly_score(model, scaler, suspicious_txn)
-    print(f"\nSuspicious Transaction Test:")
-    print(f"  Anomaly Score: {score:.3f}")
-    print(f"  Risk Level: {risk}")
-    print(f"  Reasons: {', '.join(reasons)}")
-    
-    print("\n" + "="*60)
-    print("TRAINING COMPLETE")
-    print("="*60)
-    print(f"Finished at: {datetime.now()}")
-    print(f"\nModel files saved in: {output_dir}")
-    print(f"  - anomaly_model.pkl (Isolation Forest)")
-    print(f"  - anomaly_scaler.pkl (RobustScaler)")
-    print(f"  - anomaly_features.txt (Feature list)")
-    print(f"  - anomaly_metadata.pkl (Thresholds & metrics)")
-    
-    print("\n📊 Key Metrics:")
-    print(f"  - Samples trained on: {metrics['n_samples']}")
-    print(f"  - Anomalies detected: {metrics['n_anomalies']} ({metrics['contamination_rate']:.1%})")
-    print(f"  - High-risk transactions: {metrics['high_risk_count']}")
-    
-    print("\n🎯 Next Steps:")
-    print("  1. Use load_model() to load the trained model")
-    print("  2. Extract features for new transactions")
-    print("  3. Call predict_anomaly_score() to get risk assessment")
-    print("  4. Integrate with validationService.ts for real-time scoring")
+    # Score both demo transactions in one call on the prebuilt arrays
+    scores, risks = predict_from_array(model, scaler, np.vstack([_NORMAL, _SUSPICIOUS]))
+    reasons = explain_anomalies([DEMO_NORMAL_TXN, DEMO_SUSPICIOUS_TXN])
+    
+    print("\n".join([
+        "\n" + "="*60,
+        "DEMO: Testing anomaly detection",
+        "="*60,
+        
+        # Test a normal transaction
+        f"\nNormal Transaction Test:",
+        f"  Anomaly Score: {scores[0]:.3f}",
+        f"  Risk Level: {risks[0]}",
+        f"  Reasons: {reasons[0] if reasons[0] else 'None - appears normal'}",
+        
+        # Test a suspicious transaction
+        f"\nSuspicious Transaction Test:",
+        f"  Anomaly Score: {scores[1]:.3f}",
+        f"  Risk Level: {risks[1]}",
+        f"  Reasons: {', '.join(reasons[1])}",
+    ]))
+    
+    model_files = [
+        "  - anomaly_model.pkl (Isolation Forest)",
+        "  - anomaly_model.onnx (Scaler + Isolation Forest for onnxruntime)" if ONNX_EXPORT_AVAILABLE else None,
+        "  - anomaly_scaler.pkl (RobustScaler)",
+        "  - anomaly_scaler.npz (Scaler center/scale arrays)",
+        "  - anomaly_features.json (Feature list)",
+        "  - anomaly_metadata.pkl (Thresholds & metrics)",
+    ]
+    print("\n".join([
+        "\n" + "="*60,
+        "TRAINING COMPLETE",
+        "="*60,
+        f"Elapsed: {(time.monotonic_ns() - started_ns) / 1e9:.2f}s",
+        f"\nModel files saved in: {targets.output_dir}",
+        *[line for line in model_files if line],
+        
+        "\n📊 Key Metrics:",
+        f"  - Samples trained on: {metrics['n_samples']}",
+        f"  - Anomalies detected: {metrics['n_anomalies']} ({metrics['contamination_rate']:.1%})",
+        f"  - High-risk transactions: {metrics['high_risk_count']}",
+        
+        "\n🎯 Next Steps:",
+        "  1. Use load_model() to load the trained model",
+        "  2. Extract features for new transactions",
+        "  3. Call predict_anomaly_score() to get risk assessment",
+        "  4. Integrate with validationService.ts for real-time scoring",
+    ]))
+
+
+# The 19 payees synthetic transactions are drawn from (receiver_name categories)
+SYNTHETIC_RECEIVERS = [f'Receiver_{k}' for k in range(1, 20)]
+
+# 0/1 features of the synthetic dataset, stored as int8
+SYNTHETIC_FLAG_COLUMNS = [
+    'is_above_max', 'is_new_payee', 'is_unusual_hour', 'is_weekend',
+    'is_night_transaction', 'is_dormant'
+]
 
 
 def create_synthetic_dataset(n_samples: int = 500) -> pd.DataFrame:
@@ -824,87 +1321,85 @@ def create_synthetic_dataset(n_samples: int = 500) -> pd.DataFrame:
     print(f"\nGenerating {n_samples} synthetic transactions...")
     print("(Creating realistic patterns with natural variation)")
     
-    np.random.seed(42)
-    
-    data = []
+    rng = np.random.default_rng(42)
     
     # Create 5 different customer profiles (different "normal" behaviors)
-    customer_profiles = [
-        {'avg_amt': 25000, 'std_amt': 5000, 'usual_hour': 10, 'txn_freq': 2},   # Low-value, morning
-        {'avg_amt': 75000, 'std_amt': 15000, 'usual_hour': 14, 'txn_freq': 3},  # Medium-value, afternoon
-        {'avg_amt': 150000, 'std_amt': 30000, 'usual_hour': 11, 'txn_freq': 1}, # High-value, less frequent
-        {'avg_amt': 50000, 'std_amt': 20000, 'usual_hour': 15, 'txn_freq': 5},  # Variable, high frequency
-        {'avg_amt': 100000, 'std_amt': 10000, 'usual_hour': 9, 'txn_freq': 2},  # Consistent, morning
-    ]
+    # Columns: avg_amt, std_amt, usual_hour, txn_freq
+    customer_profiles = np.array([
+        [25000, 5000, 10, 2],     # Low-value, morning
+        [75000, 15000, 14, 3],    # Medium-value, afternoon
+        [150000, 30000, 11, 1],   # High-value, less frequent
+        [50000, 20000, 15, 5],    # Variable, high frequency
+        [100000, 10000, 9, 2],    # Consistent, morning
+    ])
+    
+    # Every column is drawn for all samples at once
+    # Assign each transaction to a customer profile
+    account_id = rng.integers(1, 6, n_samples)
+    avg_amt, std_amt, usual_hour, txn_freq = customer_profiles[account_id - 1].T
+    
+    # Generate mostly normal transactions with occasional natural outliers
+    is_outlier = rng.random(n_samples) < 0.03  # ~3% natural outliers
+    
+    # Natural outliers (not fraud, just unusual): large amounts at unusual hours
+    # Normal transactions: amount around the profile average (minimum 1000)
+    amount = np.where(
+        is_outlier,
+        rng.uniform(avg_amt * 2, avg_amt * 4),
+        np.maximum(1000, rng.normal(avg_amt, std_amt))
+    )
+    hour = np.where(
+        is_outlier,
+        rng.choice([2, 3, 4, 22, 23], n_samples),
+        np.trunc(rng.normal(usual_hour, 2)).astype(int) % 24
+    )
+    is_new_payee = np.where(is_outlier, 1, rng.choice([0, 1], n_samples, p=[0.8, 0.2]))
+    
+    # Calculate features based on profile
+    amount_zscore = (amount - avg_amt) / std_amt
+    
+    df = pd.DataFrame({
+        'transaction_id': np.arange(1, n_samples + 1),
+        'account_id': account_id,
+        'amount': amount,
+        'receiver_name': pd.Categorical.from_codes(rng.integers(0, 19, n_samples), categories=SYNTHETIC_RECEIVERS),
+        
+        # Amount features (4)
+        'amount_zscore': amount_zscore,
+        'amount_to_max_ratio': amount / (avg_amt + 2 * std_amt),
+        'amount_to_balance_ratio': amount / rng.uniform(200000, 500000, n_samples),
+        'is_above_max': (amount_zscore > 2).astype(int),
+        
+        # Payee features (3)
+        'is_new_payee': is_new_payee,
+        'payee_frequency': np.where(is_new_payee == 1, 0, rng.integers(0, 10, n_samples)),
+        'unique_payee_ratio': rng.uniform(0.3, 0.7, n_samples),
+        
+        # Time features (5)
+        'hour_of_day': hour,
+        'day_of_week': rng.integers(0, 7, n_samples),
+        'is_unusual_hour': ((hour < 6) | (hour > 20)).astype(int),
+        'is_weekend': (rng.random(n_samples) < 0.3).astype(int),
+        'is_night_transaction': ((hour < 6) | (hour > 21)).astype(int),
+        
+        # Velocity features (4)
+        'txn_count_24h': rng.poisson(txn_freq),
+        'txn_count_7d': rng.poisson(txn_freq * 5),
+        'days_since_last_txn': rng.integers(0, 15, n_samples),
+        'is_dormant': (rng.random(n_samples) < 0.02).astype(int),
+        
+        # Account health (3)
+        'account_age_days': rng.integers(100, 1500, n_samples),
+        'bounce_rate': rng.uniform(0, 0.05, n_samples),
+        'avg_balance': rng.uniform(100000, 500000, n_samples),
+        
+        # Signature score (1) - most are good, clipped to valid range
+        'signature_score': np.clip(rng.normal(88, 8, n_samples), 40, 100)
+    })
     
-    for i in range(n_samples):
-        # Assign to a customer profile
-        account_id = np.random.randint(1, 6)
-        profile = customer_profiles[account_id - 1]
-        
-        # Generate mostly normal transactions with occasional natural outliers
-        is_outlier = np.random.random() < 0.03  # ~3% natural outliers
-        
-        if is_outlier:
-            # Natural outlier (not fraud, just unusual)
-            amount = np.random.uniform(profile['avg_amt'] * 2, profile['avg_amt'] * 4)
-            hour = np.random.choice([2, 3, 4, 22, 23])  # Unusual hours
-            is_new_payee = 1
-        else:
-            # Normal transaction
-            amount = np.random.normal(profile['avg_amt'], profile['std_amt'])
-            amount = max(1000, amount)  # Minimum 1000
-            hour = int(np.random.normal(profile['usual_hour'], 2)) % 24
-            is_new_payee = np.random.choice([0, 1], p=[0.8, 0.2])
-        
-        # Calculate features based on profile
-        amount_zscore = (amount - profile['avg_amt']) / profile['std_amt']
-        
-        features = {
-            'transaction_id': i + 1,
-            'account_id': account_id,
-            'amount': amount,
-            'receiver_name': f'Receiver_{np.random.randint(1, 20)}',
-            
-            # Amount features (4)
-            'amount_zscore': amount_zscore,
-            'amount_to_max_ratio': amount / (profile['avg_amt'] + 2 * profile['std_amt']),
-            'amount_to_balance_ratio': amount / np.random.uniform(200000, 500000),
-            'is_above_max': 1 if amount_zscore > 2 else 0,
-            
-            # Payee features (3)
-            'is_new_payee': is_new_payee,
-            'payee_frequency': np.random.randint(0, 10) if not is_new_payee else 0,
-            'unique_payee_ratio': np.random.uniform(0.3, 0.7),
-            
-            # Time features (5)
-            'hour_of_day': hour,
-            'day_of_week': np.random.randint(0, 7),
-            'is_unusual_hour': 1 if hour < 6 or hour > 20 else 0,
-            'is_weekend': 1 if np.random.random() < 0.3 else 0,
-            'is_night_transaction': 1 if hour < 6 or hour > 21 else 0,
-            
-            # Velocity features (4)
-            'txn_count_24h': np.random.poisson(profile['txn_freq']),
-            'txn_count_7d': np.random.poisson(profile['txn_freq'] * 5),
-            'days_since_last_txn': np.random.randint(0, 15),
-            'is_dormant': 1 if np.random.random() < 0.02 else 0,
-            
-            # Account health (3)
-            'account_age_days': np.random.randint(100, 1500),
-            'bounce_rate': np.random.uniform(0, 0.05),
-            'avg_balance': np.random.uniform(100000, 500000),
-            
-            # Signature score (1) - most are good
-            'signature_score': np.random.normal(88, 8)
-        }
-        
-        # Clip signature score to valid range
-        features['signature_score'] = np.clip(features['signature_score'], 40, 100)
-        
-        data.append(features)
-    
-    df = pd.DataFrame(data)
+    # Same narrow dtypes as the database path: float32 features, int8 flags
+    df = df.astype({col: np.int8 if col in SYNTHETIC_FLAG_COLUMNS else np.float32
+                    for col in FEATURE_COLUMNS})
     
     print(f"Generated {len(df)} transactions across {df['account_id'].nunique()} accounts")
     print(f"Natural outliers (amount_zscore > 2): {(df['amount_zscore'] > 2).sum()}")